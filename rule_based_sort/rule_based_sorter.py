@@ -2,15 +2,464 @@
 A module for sorting and renaming files based on configurable rules.
 """
 
+import errno
+import functools
 import os
 import re
 import shutil
-from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import yaml
 from pathvalidate import sanitize_filename, sanitize_filepath
 
+# The libyaml based loader is much faster, but not available in every build
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+# Template references like $template.name
+_TEMPLATE_REF_RE = re.compile(r"\$template\.(\w+)")
+
+# Placeholders like {field} or {field1|field2|'default'}
+_PLACEHOLDER_RE = re.compile(r"\{([^}]+)\}")
+
+# Errors from os.link when the file cannot be hard linked to its destination
+_NO_LINK_ERRNOS = frozenset(
+    code
+    for code in (
+        errno.EXDEV,
+        errno.EPERM,
+        errno.EINVAL,  # Windows, on filesystems without hard links
+        errno.EMLINK,
+        errno.ENOSYS,
+        getattr(errno, "ENOTSUP", None),
+        getattr(errno, "EOPNOTSUPP", None),
+    )
+    if code is not None
+)
+
+# Moving files is I/O bound, so more threads than CPUs pay off
+_DEFAULT_MOVE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_yaml_cached(config_path: str, mtime_ns: int, size: int) -> Dict:
+    """
+    Parses a YAML configuration file. Cached by path, modification time and
+    size, so a changed file is parsed again. Callers must not modify the result.
+    """
+    with open(config_path, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_code(source: str, filename: str, mode: str):
+    """
+    Compiles generated condition code. Cached by source, which only depends
+    on the conditions, so sorters with the same rules compile them once.
+    Constants the code refers to are supplied when it is evaluated.
+    """
+    return compile(source, filename, mode)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_regex(pattern: str) -> Optional[re.Pattern]:
+    """Compiles a user-supplied regex, returning None if it is invalid."""
+    try:
+        return re.compile(pattern)
+    except re.error:
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def _san_relpath(relative_path: str) -> str:
+    """
+    Sanitizes a path relative to the output directory, cached since many
+    files share a destination. The path is anchored at the root while
+    sanitizing, so it can't escape the output directory.
+    """
+    # pathvalidate emits "/" separators on every platform (it sanitizes for
+    # all platforms by default), so "/" anchors the path and both separators
+    # are stripped from the result
+    sanitized = sanitize_filepath("/" + relative_path, replacement_text="_")
+    return sanitized.lstrip("/\\")
+
+
+@functools.lru_cache(maxsize=4096)
+def _san_name(filename: str) -> str:
+    """Sanitizes a filename, cached for repeated names."""
+    return sanitize_filename(filename, replacement_text="_")
+
+
+# Marks metadata fields that are not present (as opposed to being None)
+_MISSING = object()
+
+
+def _condition_group(conditions: Dict) -> Dict:
+    """
+    Returns the top-level conditions of a rule as a group.
+
+    Like _evaluate_conditions and the compiled predicates, the top level is
+    always read as a group, with 'logic' defaulting to AND and 'rules' to an
+    empty list (even if it looks like a single condition).
+
+    Args:
+        conditions: The 'conditions' dictionary of a rule
+
+    Returns:
+        Dictionary with 'logic' and 'rules'
+    """
+    return {"logic": "AND", "rules": [], **conditions}
+
+
+def _condition_fields(condition: Dict) -> set:
+    """
+    Collects the metadata fields a condition depends on.
+
+    Args:
+        condition: Dictionary with field, operator, value or nested rule
+
+    Returns:
+        Set of field names
+    """
+    if "logic" in condition:
+        return set().union(*map(_condition_fields, condition.get("rules", [])))
+    return {condition.get("field")}
+
+
+# Relative cost of evaluating each operator, used to order conditions
+_OPERATOR_COSTS = {
+    "equals": 0,
+    "not_equals": 0,
+    "starts_with": 1,
+    "ends_with": 1,
+    "contains": 2,
+    "regex": 3,
+}
+
+
+def _condition_cost(condition: Dict) -> int:
+    """
+    Estimates how expensive a condition is to evaluate.
+
+    Args:
+        condition: Dictionary with field, operator, value or nested rule
+
+    Returns:
+        Cost of the operator, or of the most expensive condition in a nested rule
+    """
+    if "logic" in condition:
+        return max(map(_condition_cost, condition.get("rules", [])), default=0)
+    # Unknown operators compile to a constant False
+    return _OPERATOR_COSTS.get(condition.get("operator"), 0)
+
+
+def _literal(value, constants: Dict) -> str:
+    """
+    Returns Python source for a value used in generated condition code.
+
+    Strings, numbers, booleans and None are written as literals; anything
+    else is added to constants and referenced by name.
+
+    Args:
+        value: The value to reference
+        constants: Names and values available to the generated code
+
+    Returns:
+        Python expression evaluating to value
+    """
+    if value is None or type(value) in (str, int, bool):
+        return repr(value)
+    name = f"_c{len(constants)}"
+    constants[name] = value
+    return name
+
+
+def _equality_constraints(condition: Dict) -> Dict[str, set]:
+    """
+    Determines which values fields must equal for a condition to be met.
+
+    Examples:
+        {field: a, operator: equals, value: 1} -> {a: {1}}
+        AND of equals on a and b -> {a: {...}, b: {...}}
+        OR of equals on a -> {a: {1, 2}}
+
+    Args:
+        condition: Condition dictionary (simple or with logic and rules)
+
+    Returns:
+        Dictionary mapping field names to the set of allowed values. Fields
+        not in the dictionary are not restricted to a known set of values.
+    """
+    if "logic" not in condition:
+        if condition.get("operator") == "equals":
+            value = condition.get("value")
+            try:
+                return {condition.get("field"): {value}}
+            except TypeError:
+                # Unhashable value, cannot be used for indexing
+                return {}
+        return {}
+
+    logic = condition.get("logic", "AND").upper()
+    children = [_equality_constraints(rule) for rule in condition.get("rules", [])]
+    if not children:
+        return {}
+
+    constraints = {}
+    if logic == "AND":
+        # Every child must hold, so each field is restricted by all of them
+        for child in children:
+            for field, values in child.items():
+                constraints[field] = constraints.get(field, values) & values
+    elif logic == "OR":
+        # A field is only restricted if every alternative restricts it
+        for field in set.intersection(*(set(child) for child in children)):
+            constraints[field] = set().union(*(child[field] for child in children))
+
+    return constraints
+
+
+def _expand_templates(templates: Dict) -> Dict:
+    """
+    Resolves $template.name references inside template values.
+
+    Args:
+        templates: Dictionary of named templates as defined in the config
+
+    Returns:
+        Dictionary of templates without references to other known templates
+
+    Raises:
+        ValueError: If templates reference each other in a cycle
+    """
+    resolved = {}
+    expanding = []  # Templates being expanded, a repeated name is a cycle
+
+    def expand(name: str) -> str:
+        if name in resolved:
+            return resolved[name]
+        if name in expanding:
+            raise ValueError(f"Circular $template reference in template '{name}'")
+        expanding.append(name)
+        # References to unknown templates are left as is
+        value = _TEMPLATE_REF_RE.sub(
+            lambda match: (
+                expand(match.group(1))
+                if match.group(1) in templates
+                else match.group(0)
+            ),
+            templates[name],
+        )
+        expanding.pop()
+        resolved[name] = value
+        return value
+
+    for name in templates:
+        expand(name)
+
+    return resolved
+
+
+class _TemplateProgram(list):
+    """
+    Compiled template instructions (see _compile_template).
+
+    Hashed by identity so programs can be part of cache keys. Also records
+    the metadata fields the template reads and whether it uses the original
+    filename ({original} or {ext}).
+    """
+
+    __hash__ = object.__hash__
+
+    fields: Tuple[str, ...] = ()
+    uses_filename: bool = False
+
+
+def _compile_template(template: str, templates: Dict) -> _TemplateProgram:
+    """
+    Pre-tokenizes a path/filename template into a list of instructions.
+
+    Template references (e.g., $template.name) are resolved once, and each
+    placeholder is turned into one of:
+        ("lit", text)         literal text
+        ("orig", None)        {original}: original filename without extension
+        ("ext", None)         {ext}: extension of the original filename
+        ("chain", options)    {field1|field2|'default'}: tuple of
+                              ("field", name) / ("lit", text) fallbacks
+
+    Args:
+        template: String with placeholders like {metadata_key} or $template.template_name
+        templates: Dictionary of named templates
+
+    Returns:
+        List of (op, arg) instructions, see _render
+    """
+    # First, resolve template references ($template.name).
+    # If a template is not found, the reference is left as is.
+    template = _TEMPLATE_REF_RE.sub(
+        lambda match: templates.get(match.group(1), match.group(0)), template
+    )
+    return _compile_resolved_template(template)
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_resolved_template(template: str) -> _TemplateProgram:
+    """
+    Compiles a template without template references, see _compile_template.
+    Cached, so sorters with the same templates share their programs.
+    """
+    program = _TemplateProgram()
+    fields = {}  # Ordered set of referenced fields
+    position = 0
+    for match in _PLACEHOLDER_RE.finditer(template):
+        if match.start() > position:
+            program.append(("lit", template[position : match.start()]))
+        position = match.end()
+
+        placeholder_content = match.group(1)
+
+        # Check if this is a special placeholder
+        if placeholder_content == "original":
+            program.append(("orig", None))
+            program.uses_filename = True
+            continue
+        elif placeholder_content == "ext":
+            program.append(("ext", None))
+            program.uses_filename = True
+            continue
+
+        # Split by pipe to get fallback options
+        options = []
+        for option in placeholder_content.split("|"):
+            option = option.strip()
+            # Quoted literal ends the chain, later options are never reached
+            if (option.startswith("'") and option.endswith("'")) or (
+                option.startswith('"') and option.endswith('"')
+            ):
+                options.append(("lit", option[1:-1]))
+                break
+            # The original filename is not usable as a placeholder field
+            if option != "filename":
+                options.append(("field", option))
+                fields[option] = None
+        program.append(("chain", tuple(options)))
+
+    if position < len(template):
+        program.append(("lit", template[position:]))
+
+    program.fields = tuple(fields)
+    return program
+
+
+def _render(program: _TemplateProgram, metadata: Dict, original_filename: str) -> str:
+    """
+    Renders a template compiled with _compile_template.
+
+    Files with the same values in the fields the template reads (e.g. the
+    same event title for a path) share one memoized result.
+
+    Args:
+        program: Compiled template instructions
+        metadata: Dictionary with file metadata
+        original_filename: Original filename
+
+    Returns:
+        String with replaced placeholders
+    """
+    values = []
+    for field in program.fields:
+        value = metadata.get(field)
+        # None and empty values are skipped by fallbacks, "" does the same
+        if value is None:
+            values.append("")
+        else:
+            values.append(value if type(value) is str else str(value))
+
+    return _render_values(
+        program,
+        tuple(values),
+        original_filename if program.uses_filename else "",
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def _render_values(
+    program: _TemplateProgram, values: Tuple[str, ...], original_filename: str
+) -> str:
+    """
+    Renders a compiled template from the text values of its fields.
+
+    Args:
+        program: Compiled template instructions
+        values: Text of each field in program.fields ("" if missing or None)
+        original_filename: Original filename (only used for {original} and {ext})
+
+    Returns:
+        String with replaced placeholders
+    """
+    field_values = dict(zip(program.fields, values))
+
+    # Split once per file for {original} and {ext}
+    stem, suffix = os.path.splitext(original_filename)
+
+    parts = []
+    append = parts.append
+    for op, arg in program:
+        if op == "lit":
+            append(arg)
+        elif op == "chain":
+            for kind, option in arg:
+                if kind == "lit":
+                    append(option)
+                    break
+                # Use the field value if it's not empty
+                text = field_values[option]
+                if text.strip():
+                    append(text)
+                    break
+        elif op == "orig":
+            append(stem)
+        elif op == "ext":
+            append(suffix)
+    return "".join(parts)
+
+
+class _RuleGroup(list):
+    """
+    Rules that can possibly match a discriminator value, in config order.
+
+    match_all evaluates the conditions of all rules in the group in one call
+    and returns a bitmask with bit i set if rule i matches.
+    """
+
+    match_all: Callable[[Dict], int]
+
+
+def _compile_matcher(rules: List[Dict], constants: Dict) -> Callable[[Dict], int]:
+    """
+    Compiles the conditions of several rules into one function returning a
+    bitmask of the matching rules (see _RuleGroup).
+
+    Args:
+        rules: Rules with generated condition source ('_condition_source')
+        constants: Names and values referenced by the condition source
+
+    Returns:
+        Function taking file metadata and returning the bitmask
+    """
+    lines = ["def match_all(m):", "    r = 0"]
+    for i, rule in enumerate(rules):
+        lines.append(f"    if {rule['_condition_source']}: r |= {1 << i}")
+    lines.append("    return r")
+
+    namespace = {}
+    exec(_compile_code("\n".join(lines), "<rules>", "exec"), constants, namespace)
+    return namespace["match_all"]
+
 
 class FileSorter:
     """
@@ -26,26 +475,196 @@ class FileSorter:
             config_path: Path to the YAML configuration file
             base_output_dir: Base directory for all output paths
         """
-        self.templates = {}  # Initialize before loading config
-        self.config = self._load_config(config_path)
+        self._init_from_dict(self._load_config(config_path), base_output_dir)
+
+    @classmethod
+    def from_dict(cls, config: Dict, base_output_dir: str) -> "FileSorter":
+        """
+        Creates a FileSorter from an already loaded configuration, e.g. when
+        the rules are built in code or come from another source than a file.
+
+        Args:
+            config: Dictionary with the same structure as the YAML configuration
+            base_output_dir: Base directory for all output paths
+
+        Returns:
+            New FileSorter instance (the given config is not modified)
+        """
+        sorter = cls.__new__(cls)
+        sorter._init_from_dict(config, base_output_dir)
+        return sorter
+
+    def _init_from_dict(self, config: Dict, base_output_dir: str) -> None:
+        """
+        Initializes the FileSorter with a loaded configuration.
+
+        Args:
+            config: Dictionary with the same structure as the YAML configuration
+            base_output_dir: Base directory for all output paths
+        """
+        self.templates = {}  # Initialize before preparing config
+        self._template_cache = {}  # Compiled programs by template string
+        self.config = self._prepare_config(config)
         self.base_output_dir = os.path.abspath(base_output_dir)
+        self._sanitized_base = sanitize_filepath(
+            self.base_output_dir, replacement_text="_"
+        )
+        # Sanitized base with trailing separator, relative paths are appended to
+        # it. pathvalidate emits "/" separators on every platform (also for the
+        # base), so "/" is used here as well.
+        self._output_prefix = self._sanitized_base.rstrip("/") + "/"
+        self._ensured_dirs = set()  # Destination directories already created
+        self._ensured_dirs_lock = threading.Lock()
 
     def _load_config(self, config_path: str) -> Dict:
-        """Loads the YAML configuration file."""
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = yaml.safe_load(f)
-        
-        # Store templates for later use
-        self.templates = config.get("templates", {})
+        """Loads the YAML configuration file. The result is cached, don't modify it."""
+        config_path = os.path.abspath(config_path)
+        stat = os.stat(config_path)
+        return _load_yaml_cached(config_path, stat.st_mtime_ns, stat.st_size)
+
+    def _prepare_config(self, config: Dict) -> Dict:
+        """
+        Resolves templates and compiles the rules of a loaded configuration.
+
+        Args:
+            config: Dictionary with the same structure as the YAML configuration
+
+        Returns:
+            Configuration with rules extended by their compiled conditions and
+            templates
+
+        Raises:
+            ValueError: If templates, conditions or match_mode are invalid
+        """
+        # Rules are extended with compiled data below, so the given data is
+        # copied down to the rule dictionaries. Their conditions are only
+        # read and stay shared.
+        config = dict(config)
+        if "rules" in config:
+            config["rules"] = [dict(rule) for rule in config["rules"]]
+
+        # Store templates for later use, with nested references resolved
+        self.templates = _expand_templates(config.get("templates") or {})
         
+        # Generated condition code of all rules shares one namespace, so rules
+        # can be combined into one matcher (see _compile_matcher)
+        constants = {"__builtins__": {}, "str": str}
+
         # Convert simplified 'when' syntax to 'conditions' format
         if "rules" in config:
             for rule in config["rules"]:
                 if "when" in rule and "conditions" not in rule:
                     rule["conditions"] = self._convert_when_to_conditions(rule["when"])
                     del rule["when"]
-        
+
+            # Compile conditions and templates once instead of per file. Each
+            # condition tree becomes a single Python expression, so evaluating
+            # it is a chain of native comparisons.
+            for rule in config["rules"]:
+                try:
+                    rule["_condition_source"] = self._conditions_source(
+                        rule.get("conditions", {}), constants
+                    )
+                except ValueError as e:
+                    raise ValueError(
+                        f"Invalid conditions in rule '{rule.get('name', 'Unnamed')}': {e}"
+                    ) from e
+                rule["_predicate"] = eval(
+                    _compile_code(
+                        f"lambda m: {rule['_condition_source']}",
+                        "<conditions>",
+                        "eval",
+                    ),
+                    constants,
+                )
+                rule["_path_program"] = self._compiled_template(rule.get("path", "."))
+                rule["_filename_program"] = self._compiled_template(
+                    rule.get("filename", "{original}")
+                )
+
+        match_mode = config.get("match_mode", "unique")
+        if match_mode not in ("unique", "first"):
+            raise ValueError(
+                f"Invalid match_mode '{match_mode}', expected 'unique' or 'first'"
+            )
+
+        self._index_rules(config.get("rules", []), constants)
+
+        # Fields referenced by any condition, rules only depend on these
+        condition_fields = set()
+        for rule in config.get("rules", []):
+            condition_fields |= _condition_fields(
+                _condition_group(rule.get("conditions", {}))
+            )
+        self._condition_fields = sorted(condition_fields, key=str)
+
         return config
+
+    def _index_rules(self, rules: List[Dict], constants: Dict) -> None:
+        """
+        Groups rules by the value of a discriminator field.
+
+        Most rules require a field (typically postbox_type) to equal one of a
+        few values. The field restricting the most rules is chosen and, for
+        each of its values, the rules that can possibly match are stored in
+        config order. Rules not restricted by that field are part of every group.
+        Each group gets a matcher evaluating all of its rules in one call.
+
+        Args:
+            rules: List of rules with generated condition source
+            constants: Names and values referenced by the condition source
+        """
+        constraints = [
+            _equality_constraints(_condition_group(rule.get("conditions", {})))
+            for rule in rules
+        ]
+
+        field_counts = {}
+        for rule_constraints in constraints:
+            for field in rule_constraints:
+                field_counts[field] = field_counts.get(field, 0) + 1
+
+        self._discriminator = (
+            max(field_counts, key=field_counts.get) if field_counts else None
+        )
+        self._unindexed_rules = _RuleGroup()
+        self._rule_index = {}
+
+        for rule, rule_constraints in zip(rules, constraints):
+            values = rule_constraints.get(self._discriminator)
+            if values is None:
+                self._unindexed_rules.append(rule)
+                # Unrestricted rules can match any value, keep groups in config order
+                for group in self._rule_index.values():
+                    group.append(rule)
+            else:
+                for value in values:
+                    if value not in self._rule_index:
+                        self._rule_index[value] = _RuleGroup(self._unindexed_rules)
+                    self._rule_index[value].append(rule)
+
+        for group in (self._unindexed_rules, *self._rule_index.values()):
+            group.match_all = _compile_matcher(group, constants)
+
+    def _candidate_rules(self, metadata: Dict) -> _RuleGroup:
+        """
+        Returns the rules that can possibly match the given metadata, in config order.
+
+        Args:
+            metadata: Dictionary with file metadata
+
+        Returns:
+            List of rules to evaluate
+        """
+        if self._discriminator not in metadata:
+            return self._unindexed_rules
+        try:
+            return self._rule_index.get(
+                metadata[self._discriminator], self._unindexed_rules
+            )
+        except TypeError:
+            # Unhashable metadata value, cannot equal any indexed value
+            return self._unindexed_rules
     
     def _convert_when_to_conditions(self, when: Dict) -> Dict:
         """
@@ -140,10 +759,10 @@ class FileSorter:
         elif operator == "ends_with":
             return str(file_value).endswith(value)
         elif operator == "regex":
-            try:
-                return bool(re.search(value, str(file_value)))
-            except re.error:
+            pattern = _compile_regex(value)
+            if pattern is None:
                 return False
+            return bool(pattern.search(str(file_value)))
 
         return False
 
@@ -172,6 +791,106 @@ class FileSorter:
 
         return False
 
+    def _condition_source(self, condition: Dict, constants: Dict) -> str:
+        """
+        Generates a Python expression for a single condition.
+
+        The expression reads file metadata from the variable 'm'. Values that
+        can't be written as literals are added to constants and referenced by name.
+
+        Args:
+            condition: Dictionary with field, operator, value or nested rule
+            constants: Names and values available to the generated expression
+
+        Returns:
+            Python expression that is True if the condition is met
+
+        Raises:
+            ValueError: If a regex pattern is invalid
+        """
+        # Nested rule (with logic and rules)
+        if "logic" in condition:
+            return self._conditions_source(condition, constants)
+
+        # Simple condition
+        field = _literal(condition.get("field"), constants)
+        operator = condition.get("operator")
+        value = _literal(condition.get("value"), constants)
+
+        if operator == "equals":
+            test = f"m[{field}] == {value}"
+        elif operator == "not_equals":
+            test = f"m[{field}] != {value}"
+        elif operator == "contains":
+            test = f"{value} in str(m[{field}])"
+        elif operator == "starts_with":
+            test = f"str(m[{field}]).startswith({value})"
+        elif operator == "ends_with":
+            test = f"str(m[{field}]).endswith({value})"
+        elif operator == "regex":
+            # Validate the pattern now so evaluating it can't fail later
+            pattern = condition.get("value")
+            if not isinstance(pattern, str):
+                # e.g. an unquoted number in YAML
+                raise ValueError(f"Invalid regex '{pattern}': pattern must be a string")
+            try:
+                pattern = re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid regex '{pattern}': {e}") from e
+            search = _literal(pattern.search, constants)
+            test = f"{search}(str(m[{field}])) is not None"
+        else:
+            # Unknown operator never matches
+            return "False"
+
+        return f"({field} in m and {test})"
+
+    def _conditions_source(self, conditions: Dict, constants: Dict) -> str:
+        """
+        Generates a Python expression for multiple conditions with AND/OR logic.
+
+        Args:
+            conditions: Dictionary with 'logic' (AND/OR) and 'rules' (list of conditions)
+            constants: Names and values available to the generated expression
+
+        Returns:
+            Python expression with the same result as _evaluate_conditions
+        """
+        logic = conditions.get("logic", "AND").upper()
+        rules = conditions.get("rules", [])
+
+        # Empty rule list = always True (for fallback rules)
+        if not rules:
+            return "True"
+
+        if logic not in ("AND", "OR"):
+            return "False"
+
+        # Conditions have no side effects, so cheap checks can run first and
+        # short-circuit the expensive ones (stable sort keeps config order otherwise)
+        parts = [
+            self._condition_source(rule, constants)
+            for rule in sorted(rules, key=_condition_cost)
+        ]
+        return "(" + f" {logic.lower()} ".join(parts) + ")"
+
+    def _compiled_template(self, template: str) -> _TemplateProgram:
+        """
+        Returns the compiled program for a template, compiling it on first use.
+        Rules sharing a template (e.g. $template.name) share one program.
+
+        Args:
+            template: String with placeholders like {metadata_key} or $template.template_name
+
+        Returns:
+            Compiled template instructions, see _render
+        """
+        program = self._template_cache.get(template)
+        if program is None:
+            program = _compile_template(template, self.templates)
+            self._template_cache[template] = program
+        return program
+
     def _replace_placeholders(
         self, template: str, metadata: Dict, original_filename: str
     ) -> str:
@@ -189,56 +908,7 @@ class FileSorter:
         Returns:
             String with replaced placeholders
         """
-        result = template
-
-        # First, resolve template references ($template.name)
-        import re
-        template_pattern = r'\$template\.(\w+)'
-        matches = re.findall(template_pattern, result)
-        for template_name in matches:
-            if template_name in self.templates:
-                template_value = self.templates[template_name]
-                result = result.replace(f"$template.{template_name}", template_value)
-            else:
-                # If template not found, leave it as is (or could raise an error)
-                pass
-
-        # Process placeholders with fallback support
-        # Pattern matches {field1|field2|'default'} or {field}
-        placeholder_pattern = r'\{([^}]+)\}'
-        
-        def replace_with_fallback(match):
-            placeholder_content = match.group(1)
-            
-            # Check if this is a special placeholder
-            if placeholder_content == "original":
-                return Path(original_filename).stem
-            elif placeholder_content == "ext":
-                return Path(original_filename).suffix
-            
-            # Split by pipe to get fallback options
-            options = [opt.strip() for opt in placeholder_content.split('|')]
-            
-            for option in options:
-                # Check if option is a quoted literal (string)
-                if (option.startswith("'") and option.endswith("'")) or \
-                   (option.startswith('"') and option.endswith('"')):
-                    # Return the literal value without quotes
-                    return option[1:-1]
-                
-                # Check if option is a metadata field
-                if option in metadata and option != "filename":
-                    value = metadata[option]
-                    # Return value if it's not None or empty string
-                    if value is not None and str(value).strip():
-                        return str(value)
-            
-            # If no fallback worked, return empty string or original placeholder
-            return ""
-        
-        result = re.sub(placeholder_pattern, replace_with_fallback, result)
-
-        return result
+        return _render(self._compiled_template(template), metadata, original_filename)
 
     def _find_all_matching_rules(self, metadata: Dict) -> List[Dict]:
         """
@@ -250,13 +920,50 @@ class FileSorter:
         Returns:
             List of all matching rules
         """
-        matching_rules = []
-        for rule in self.config.get("rules", []):
-            conditions = rule.get("conditions", {})
-            if self._evaluate_conditions(conditions, metadata):
-                matching_rules.append(rule)
+        group = self._candidate_rules(metadata)
+        mask = group.match_all(metadata)
+
+        matching = []
+        while mask:
+            # Lowest set bit first, so rules stay in config order
+            bit = mask & -mask
+            matching.append(group[bit.bit_length() - 1])
+            mask ^= bit
+        return matching
+
+    def _matching_rules(self, metadata: Dict) -> List[Dict]:
+        """
+        Finds the matching rules according to the configured match_mode.
+
+        Args:
+            metadata: Dictionary with file metadata
+
+        Returns:
+            All matching rules ('unique'), or at most the first one ('first')
+        """
+        if self.config.get("match_mode", "unique") == "first":
+            # Rules are declared in priority order, the first match wins
+            rule = self._find_first_matching_rule(metadata)
+            return [rule] if rule is not None else []
+
+        # Find ALL matching rules
+        return self._find_all_matching_rules(metadata)
+
+    def _find_first_matching_rule(self, metadata: Dict) -> Optional[Dict]:
+        """
+        Finds the first matching rule (in config order) for the given file metadata.
 
-        return matching_rules
+        Args:
+            metadata: Dictionary with file metadata
+
+        Returns:
+            The first matching rule, or None if no rule matches
+        """
+        for rule in self._candidate_rules(metadata):
+            if rule["_predicate"](metadata):
+                return rule
+
+        return None
 
     def get_new_location(
         self, original_filepath: str, **metadata
@@ -291,6 +998,74 @@ class FileSorter:
         if not os.path.exists(original_filepath):
             raise FileNotFoundError(f"File not found: {original_filepath}")
 
+        return self._get_new_location_nocheck(original_filepath, **metadata)
+
+    def _get_new_location_nocheck(
+        self, original_filepath: str, **metadata
+    ) -> Tuple[str, str, Optional[str]]:
+        """
+        Same as get_new_location, but without checking that the original file exists.
+        For callers that already know it does (e.g. from a directory listing).
+        """
+        return self._locate(original_filepath, metadata)
+
+    def get_new_locations(
+        self, original_filepaths: List[str], metadata_list: List[Dict]
+    ) -> List[Union[Tuple[str, str, Optional[str]], Exception]]:
+        """
+        Determines new paths and filenames for a batch of files.
+
+        Rules are evaluated only once for all files that share the same values
+        in the fields used by rule conditions (e.g. all dividend statements).
+
+        Args:
+            original_filepaths: Full paths to the original files
+            metadata_list: File metadata for each file, in the same order
+
+        Returns:
+            For each file, either a tuple of (absolute_new_path, new_filename,
+            rule_name) as returned by get_new_location, or the FileNotFoundError
+            or ValueError get_new_location would have raised for it
+
+        Example:
+            results = sorter.get_new_locations(
+                ['C:/files/a.pdf', 'C:/files/b.pdf'],
+                [{'DocumentType': 'Invoice'}, {'DocumentType': 'Receipt'}],
+            )
+        """
+        if len(original_filepaths) != len(metadata_list):
+            raise ValueError("original_filepaths and metadata_list differ in length")
+
+        match_cache = {}
+        results = []
+        for original_filepath, metadata in zip(original_filepaths, metadata_list):
+            try:
+                if not os.path.exists(original_filepath):
+                    raise FileNotFoundError(f"File not found: {original_filepath}")
+                results.append(self._locate(original_filepath, metadata, match_cache))
+            except (FileNotFoundError, ValueError) as e:
+                results.append(e)
+
+        return results
+
+    def _locate(
+        self,
+        original_filepath: str,
+        metadata: Dict,
+        match_cache: Optional[Dict] = None,
+    ) -> Tuple[str, str, Optional[str]]:
+        """
+        Determines a new path and filename, see get_new_location.
+
+        Args:
+            original_filepath: Full path to the original file
+            metadata: File metadata
+            match_cache: Optional dictionary to reuse matching rules between
+                files with the same values in all condition fields
+
+        Returns:
+            Tuple of (absolute_new_path, new_filename, rule_name)
+        """
         # Extract filename from path
         original_filename = os.path.basename(original_filepath)
 
@@ -298,8 +1073,23 @@ class FileSorter:
         file_metadata = {"filename": original_filename}
         file_metadata.update(metadata)
 
-        # Find ALL matching rules
-        matching_rules = self._find_all_matching_rules(file_metadata)
+        cache_key = None
+        if match_cache is not None:
+            # Values like 1, 1.0 and True are equal but their text differs (for
+            # contains, regex, ...), so the type is part of the key
+            values = [
+                file_metadata.get(field, _MISSING) for field in self._condition_fields
+            ]
+            cache_key = tuple((type(value), value) for value in values)
+            try:
+                matching_rules = match_cache.get(cache_key)
+            except TypeError:
+                # Unhashable metadata value, match without the cache
+                cache_key = matching_rules = None
+        if cache_key is None or matching_rules is None:
+            matching_rules = self._matching_rules(file_metadata)
+            if cache_key is not None:
+                match_cache[cache_key] = matching_rules
 
         if len(matching_rules) == 0:
             raise ValueError(
@@ -316,22 +1106,26 @@ class FileSorter:
         # Exactly one rule matched
         rule = matching_rules[0]
         rule_name = rule.get("name", "Unnamed")
-        path_template = rule.get("path", ".")
-        filename_template = rule.get("filename", "{original}")
 
-        relative_path = self._replace_placeholders(
-            path_template, file_metadata, original_filename
+        relative_path = _render(
+            rule["_path_program"], file_metadata, original_filename
         )
-        new_filename = self._replace_placeholders(
-            filename_template, file_metadata, original_filename
+        new_filename = _render(
+            rule["_filename_program"], file_metadata, original_filename
         )
 
-        # Combine base output dir with relative path from config
-        absolute_path = os.path.join(self.base_output_dir, relative_path)
+        # Combine the (already sanitized) base output dir with the relative path
+        # (no leading separator after sanitizing, so plain concatenation is enough)
+        relative_path = _san_relpath(relative_path)
+        absolute_path = (
+            self._output_prefix + relative_path
+            if relative_path
+            else self._sanitized_base
+        )
 
         return (
-            sanitize_filepath(absolute_path, replacement_text="_"),
-            sanitize_filename(new_filename, replacement_text="_"),
+            absolute_path,
+            _san_name(new_filename),
             rule_name,
         )
 
@@ -380,24 +1174,107 @@ class FileSorter:
                 name
             )
         """
-        # Check if original file exists
-        if not os.path.exists(original_filepath):
-            raise FileNotFoundError(f"Original file not found: {original_filepath}")
-
         # Create full destination path
         destination_dir = new_path
-        if create_dirs and not os.path.exists(destination_dir):
-            os.makedirs(destination_dir, exist_ok=True)
+        if create_dirs and destination_dir not in self._ensured_dirs:
+            # Files may be moved from several threads, create each directory once
+            with self._ensured_dirs_lock:
+                if destination_dir not in self._ensured_dirs:
+                    os.makedirs(destination_dir, exist_ok=True)
+                    self._ensured_dirs.add(destination_dir)
 
         destination_filepath = os.path.join(destination_dir, new_filename)
 
-        # Check if destination already exists
-        if os.path.exists(destination_filepath) and not overwrite:
+        # Move the file without looking at the destination first: os.link
+        # fails if it already exists, and a missing original file surfaces
+        # as FileNotFoundError.
+        try:
+            if overwrite:
+                os.replace(original_filepath, destination_filepath)
+                return destination_filepath
+            os.link(original_filepath, destination_filepath)
+        except FileExistsError:
             raise FileExistsError(
                 f"Destination file already exists: {destination_filepath}"
-            )
+            ) from None
+        except OSError as e:
+            if e.errno not in _NO_LINK_ERRNOS:
+                raise
+            if not overwrite and os.path.exists(destination_filepath):
+                raise FileExistsError(
+                    f"Destination file already exists: {destination_filepath}"
+                ) from None
+            if e.errno == errno.EXDEV:
+                # Cross-device move: copy (zero-copy where supported) and remove source
+                shutil.copy2(original_filepath, destination_filepath)
+                os.unlink(original_filepath)
+            else:
+                # The filesystem does not support hard links, rename instead
+                os.replace(original_filepath, destination_filepath)
+            return destination_filepath
 
-        # Move the file
-        shutil.move(original_filepath, destination_filepath)
+        # Remove the original; if that fails, undo the link so the file is
+        # not left in both places
+        try:
+            os.unlink(original_filepath)
+        except OSError:
+            os.unlink(destination_filepath)
+            raise
 
         return destination_filepath
+
+    def move_files_batch(
+        self,
+        jobs: List[Tuple[str, str, str]],
+        overwrite: bool = False,
+        max_workers: Optional[int] = None,
+    ) -> List[Union[str, Exception]]:
+        """
+        Moves several files concurrently, see move_file.
+
+        Args:
+            jobs: List of (original_filepath, new_path, new_filename) tuples
+            overwrite: If True, overwrites existing files at destination
+            max_workers: Number of threads used for moving (default depends
+                on the CPU count), use 1 to move files one after another
+
+        Returns:
+            List with one entry per job, in the same order: the full path to
+            the new file location, or the exception raised while moving.
+            Jobs sharing a destination are run one after another in the given
+            order, so the results are the same as moving the files in a loop.
+        """
+        results: List[Union[str, Exception]] = [None] * len(jobs)
+
+        # Moves run concurrently, so jobs must not race for a destination
+        jobs_by_destination = {}
+        for index, (_original_filepath, new_path, new_filename) in enumerate(jobs):
+            destination_filepath = os.path.normcase(
+                os.path.normpath(os.path.join(new_path, new_filename))
+            )
+            jobs_by_destination.setdefault(destination_filepath, []).append(index)
+
+        def move_in_order(indices: List[int]) -> None:
+            for index in indices:
+                original_filepath, new_path, new_filename = jobs[index]
+                try:
+                    results[index] = self.move_file(
+                        original_filepath,
+                        new_path,
+                        new_filename,
+                        create_dirs=True,
+                        overwrite=overwrite,
+                    )
+                except Exception as e:
+                    results[index] = e
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers or _DEFAULT_MOVE_WORKERS
+        ) as executor:
+            for future in as_completed(
+                executor.submit(move_in_order, indices)
+                for indices in jobs_by_destination.values()
+            ):
+                future.result()
+
+        return results
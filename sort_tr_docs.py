@@ -8,18 +8,24 @@ This module processes PDF files in a specified directory by:
 - Renaming files with timestamps and descriptive names
 """
 
-import json
 import logging
+import os
 import sys
 from datetime import datetime
 from pathlib import Path
+from typing import Optional
 
 import coloredlogs
-from jsonpath_ng.ext import parse
 
 from rule_based_sort.rule_based_sorter import FileSorter
 import csv
 
+# orjson parses large event exports considerably faster, but is optional
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 # Setup logging with coloredlogs
 logger = logging.getLogger(__name__)
 coloredlogs.install(
@@ -29,12 +35,15 @@ coloredlogs.install(
 )
 
 
-def main(target_directory: Path):
+def main(target_directory: Path, max_workers: Optional[int] = None):
     """
     Process PDF files from the specified directory:
     - Search corresponding event for the filename in all_events.json
     - Retrieve meta data from that event
     - Rename and sort files accordingly
+
+    File moves run on up to max_workers threads (default depends on the CPU
+    count); use 1 to move files one after another (e.g. on spinning disks).
     """
 
     sorter = FileSorter("config/tr_sorting_rules.yaml", base_output_dir=target_directory)
@@ -52,29 +61,40 @@ def main(target_directory: Path):
 
     # Load all events
     logger.info("Loading events from '%s'...", events_file)
-    with open(events_file, "r", encoding="utf-8") as f:
-        events = json.load(f)
+    with open(events_file, "rb") as f:
+        events = json_loads(f.read())
 
     logger.info("Loaded %d events", len(events))
 
-    # Build index of documents from events (performance optimization)
+    # Build index of documents from events, keyed by the file name in the payload
     logger.info("Building document index...")
     document_index = {}
-    jsonpath_expr = parse("$.details.sections[?(@.type=='documents')].data[*]")
-    
+
     for event in events:
-        matches = jsonpath_expr.find(event)
-        for match in matches:
-            payload = match.value.get("action", {}).get("payload", "")
-            if payload:
-                # Extract filename from payload (assuming it's a URL or path)
-                # Store the match object with the full context
-                document_index[payload] = match
-    
+        for section in (event.get("details") or {}).get("sections") or []:
+            if section.get("type") != "documents":
+                continue
+            for document in section.get("data") or []:
+                payload = (document.get("action") or {}).get("payload", "")
+                if payload:
+                    # Payload is a URL or path, strip the query string and keep the file name
+                    # Store the document together with its event, once per payload
+                    # (a document listed again replaces the earlier entry)
+                    basename = payload.split("?", 1)[0].rsplit("/", 1)[-1]
+                    document_index.setdefault(basename, {})[payload] = (document, event)
+
     logger.info("Document index built with %d entries", len(document_index))
 
     # Process all PDF files
-    pdf_files = list(target_directory.glob("*.pdf"))
+    # DirEntry.is_file() uses the file type from the directory listing, no extra stat
+    # (symlinks are followed and cost one stat each). Like Path.glob, the
+    # extension is matched case-insensitively on Windows (normcase).
+    with os.scandir(target_directory) as entries:
+        pdf_files = [
+            entry
+            for entry in entries
+            if os.path.normcase(entry.name).endswith(".pdf") and entry.is_file()
+        ]
     logger.info("Found %d PDF files in '%s'", len(pdf_files), target_directory)
 
     if not pdf_files:
@@ -86,75 +106,84 @@ def main(target_directory: Path):
     sorted_count = 0
     not_sorted_count = 0
 
-    for pdf_file in pdf_files:
-        filename = pdf_file.name
-
-        # Find matching document in index
-        all_matches = [match for payload, match in document_index.items() if filename in payload]
-
-        if len(all_matches) == 0:
-            logger.error("No matches found for file '%s'", filename)
-            not_found_count += 1
-            continue
-        elif len(all_matches) > 1:
-            logger.error(
-                "Multiple matches (%d) found for file '%s'", len(all_matches), filename
+    # Write document metadata to CSV file, opened once for the whole batch
+    csv_file = target_directory / "docs_with_metadata.csv"
+    file_exists = csv_file.exists()
+
+    # Metadata lookup and rule matching stay on this thread, file moves are
+    # I/O bound and are run as one concurrent batch afterwards
+    move_jobs = []
+    move_filenames = []
+
+    with open(csv_file, "a", newline="", encoding="utf-8-sig", buffering=1 << 16) as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(["filename", "postbox_type", "document_title", "document_detail", "event_title", "event_subtitle"])
+
+        for pdf_file in pdf_files:
+            filename = pdf_file.name
+
+            # Find matching document in index
+            all_matches = list(document_index.get(filename, {}).values())
+
+            if len(all_matches) == 0:
+                logger.error("No matches found for file '%s'", filename)
+                not_found_count += 1
+                continue
+            elif len(all_matches) > 1:
+                logger.error(
+                    "Multiple matches (%d) found for file '%s'", len(all_matches), filename
+                )
+                not_found_count += 1
+                continue
+
+            document, event = all_matches[0]
+            matched_count += 1
+
+            postbox_type = document.get("postboxType")
+            document_title = document.get("title")
+            document_detail = document.get("detail")
+            event_title = event.get("title")
+            event_subtitle = event.get("subtitle")
+            timestamp = event.get("timestamp")
+            date_time_str = (
+                datetime.fromisoformat(timestamp).strftime("%Y-%m-%d %H:%M")
+                if timestamp
+                else None
             )
-            not_found_count += 1
-            continue
-
-        match = all_matches[0]
-        matched_count += 1
-
-        postbox_type = match.value.get("postboxType")
-        document_title = match.value.get("title")
-        document_detail = match.value.get("detail")
-        event_title = match.context.context.context.context.context.value.get("title")
-        event_subtitle = match.context.context.context.context.context.value.get(
-            "subtitle"
-        )
-        timestamp = match.context.context.context.context.context.value.get("timestamp")
-        date_time_str = (
-            datetime.fromisoformat(timestamp).strftime("%Y-%m-%d %H:%M")
-            if timestamp
-            else None
-        )
-
-        # Write document metadata to CSV file
-        csv_file = target_directory / "docs_with_metadata.csv"
-        file_exists = csv_file.exists()
-
-        with open(csv_file, "a", newline="", encoding="utf-8-sig") as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(["filename", "postbox_type", "document_title", "document_detail", "event_title", "event_subtitle"])
-            writer.writerow([filename, postbox_type, document_title, document_detail, event_title, event_subtitle])
 
-        try:
-            path, name, _rule = sorter.get_new_location(
-                original_filepath=pdf_file,
-                postbox_type=postbox_type,
-                document_title=document_title,
-                document_detail=document_detail,
-                event_title=event_title,
-                event_subtitle=event_subtitle,
-                date_time_str=date_time_str,
-            )
-
-            # Move the file
-            sorter.move_file(
-                original_filepath=pdf_file,
-                new_path=path,
-                new_filename=name,
-                create_dirs=True,
-                overwrite=False,
-            )
+            # Write document metadata to CSV file
+            writer.writerow([filename, postbox_type, document_title, document_detail, event_title, event_subtitle])
 
+            try:
+                # File comes from the directory listing, no need to check it exists
+                path, name, _rule = sorter._get_new_location_nocheck(
+                    original_filepath=pdf_file.path,
+                    postbox_type=postbox_type,
+                    document_title=document_title,
+                    document_detail=document_detail,
+                    event_title=event_title,
+                    event_subtitle=event_subtitle,
+                    date_time_str=date_time_str,
+                )
+            except Exception as e:
+                logger.error("Failed to sort file '%s': %s", filename, str(e))
+                not_sorted_count += 1
+                continue
+
+            move_jobs.append((pdf_file.path, path, name))
+            move_filenames.append(filename)
+
+    results = sorter.move_files_batch(
+        move_jobs, overwrite=False, max_workers=max_workers
+    )
+    for filename, result in zip(move_filenames, results):
+        if isinstance(result, Exception):
+            logger.error("Failed to sort file '%s': %s", filename, str(result))
+            not_sorted_count += 1
+        else:
             sorted_count += 1
             logger.info("Successfully sorted file '%s'", filename)
-        except Exception as e:
-            logger.error("Failed to sort file '%s': %s", filename, str(e))
-            not_sorted_count += 1
 
     # Print summary
     logger.info("\n" + "=" * 60)
@@ -169,9 +198,12 @@ def main(target_directory: Path):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python sort_tr_docs.py <directory>")
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python sort_tr_docs.py <directory> [max_workers]")
         sys.exit(1)
 
     directory = Path(sys.argv[1])
-    main(directory)
+    if len(sys.argv) == 3:
+        main(directory, max_workers=int(sys.argv[2]))
+    else:
+        main(directory)
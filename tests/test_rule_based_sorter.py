@@ -3,14 +3,21 @@ Comprehensive unit tests for the rule_based_sorter module.
 Tests all functions, rules, operators, and edge cases.
 """
 
+import errno
+import ntpath
 import os
 import shutil
 import tempfile
 
 import pytest
 import yaml
+from pathvalidate import sanitize_filepath
 
-from rule_based_sort.rule_based_sorter import FileSorter
+from rule_based_sort.rule_based_sorter import (
+    FileSorter,
+    _compile_template,
+    _san_relpath,
+)
 
 # ============================================================================
 # FIXTURES
@@ -79,6 +86,26 @@ def test_initialization(basic_config, output_dir):
     assert sorter.base_output_dir == os.path.abspath(output_dir)
 
 
+def test_from_dict(basic_config, output_dir):
+    """Test that from_dict behaves like loading the same config from a file."""
+    with open(basic_config) as f:
+        config = yaml.safe_load(f)
+    original = yaml.safe_load(yaml.dump(config))
+
+    sorter = FileSorter.from_dict(config, output_dir)
+    from_file = FileSorter(basic_config, output_dir)
+
+    assert sorter.templates == from_file.templates
+    assert sorter.base_output_dir == from_file.base_output_dir
+    assert [rule["conditions"] for rule in sorter.config["rules"]] == [
+        rule["conditions"] for rule in from_file.config["rules"]
+    ]
+    metadata = {"postbox_type": "TEST", "event_title": "Title"}
+    assert sorter._find_all_matching_rules(metadata)[0]["name"] == "Test Rule"
+    # The given config is left as it was
+    assert config == original
+
+
 def test_load_config_with_templates(basic_config, output_dir):
     """Test that templates are loaded correctly."""
     sorter = FileSorter(basic_config, output_dir)
@@ -87,6 +114,65 @@ def test_load_config_with_templates(basic_config, output_dir):
     assert sorter.templates["standard"] == "{date_time_str} - {event_title}.pdf"
 
 
+def test_load_config_nested_templates(temp_dir, output_dir):
+    """Test that templates referencing other templates are resolved at load time."""
+    config = {
+        "templates": {
+            "date": "{date_time_str}",
+            "prefix": "$template.date - ",
+            "standard": "$template.prefix{event_title}.pdf",
+        },
+        "rules": [],
+    }
+    config_path = os.path.join(temp_dir, "config.yaml")
+    with open(config_path, "w") as f:
+        yaml.dump(config, f)
+
+    sorter = FileSorter(config_path, output_dir)
+    assert sorter.templates["standard"] == "{date_time_str} - {event_title}.pdf"
+
+
+def test_load_config_circular_templates(temp_dir, output_dir):
+    """Test that circular template references are rejected."""
+    config = {
+        "templates": {"a": "$template.b", "b": "x/$template.a"},
+        "rules": [],
+    }
+    config_path = os.path.join(temp_dir, "config.yaml")
+    with open(config_path, "w") as f:
+        yaml.dump(config, f)
+
+    with pytest.raises(ValueError, match="Circular"):
+        FileSorter(config_path, output_dir)
+
+    # Self-references and longer cycles are rejected as well
+    for templates in [
+        {"a": "$template.a"},
+        {"a": "{title} $template.a"},
+        {"ok": "x", "a": "$template.b", "b": "$template.c", "c": "$template.a"},
+    ]:
+        with pytest.raises(ValueError, match="Circular"):
+            FileSorter.from_dict({"templates": templates, "rules": []}, output_dir)
+
+
+def test_load_config_reloads_changed_file(temp_dir, output_dir):
+    """Test that cached configs are not reused after the file changes."""
+    config_path = os.path.join(temp_dir, "config.yaml")
+    with open(config_path, "w") as f:
+        yaml.dump({"templates": {"a": "first"}, "rules": []}, f)
+
+    first = FileSorter(config_path, output_dir)
+    again = FileSorter(config_path, output_dir)
+    assert again.templates == first.templates == {"a": "first"}
+
+    with open(config_path, "w") as f:
+        yaml.dump({"templates": {"a": "second version"}, "rules": []}, f)
+
+    changed = FileSorter(config_path, output_dir)
+    assert changed.templates == {"a": "second version"}
+    assert first.templates == {"a": "first"}
+
+
 # ============================================================================
 # TEST: WHEN SYNTAX CONVERSION
 # ============================================================================
@@ -195,6 +281,29 @@ def test_operator_regex_invalid(basic_config, output_dir):
     assert sorter._evaluate_condition(condition, {"title": "test"}) is False
 
 
+def test_operator_regex_invalid_in_config(output_dir):
+    """Test that invalid regex patterns in rules are rejected at load time."""
+    # Unquoted numbers in YAML are not strings and can't be compiled
+    for pattern in ["[invalid(", 2024, None]:
+        config = {
+            "rules": [
+                {
+                    "name": "Broken Regex",
+                    "conditions": {
+                        "logic": "AND",
+                        "rules": [
+                            {"field": "title", "operator": "regex", "value": pattern}
+                        ],
+                    },
+                    "path": "Test",
+                    "filename": "{title}.pdf",
+                }
+            ]
+        }
+        with pytest.raises(ValueError, match="Broken Regex.*Invalid regex"):
+            FileSorter.from_dict(config, output_dir)
+
+
 def test_condition_missing_field(basic_config, output_dir):
     """Test condition evaluation when field is missing."""
     sorter = FileSorter(basic_config, output_dir)
@@ -276,6 +385,84 @@ def test_evaluate_conditions_empty_rules(basic_config, output_dir):
     assert sorter._evaluate_conditions(conditions, {}) is True
 
 
+def test_compiled_rules_match_evaluate(output_dir):
+    """Test that compiled predicates and rule matching agree with the interpreter."""
+    config = {
+        "rules": [
+            {
+                "name": "Income Capitalized",
+                "conditions": {
+                    "logic": "AND",
+                    "rules": [
+                        {
+                            "logic": "OR",
+                            "rules": [
+                                {
+                                    "field": "type",
+                                    "operator": "equals",
+                                    "value": "INCOME",
+                                },
+                                {
+                                    "field": "type",
+                                    "operator": "starts_with",
+                                    "value": "DIV",
+                                },
+                            ],
+                        },
+                        {"field": "title", "operator": "regex", "value": r"^[A-Z]"},
+                        {
+                            "field": "status",
+                            "operator": "not_equals",
+                            "value": "PENDING",
+                        },
+                    ],
+                },
+            },
+            {
+                "name": "Lowercase Title",
+                "conditions": {
+                    "logic": "AND",
+                    "rules": [
+                        {"field": "title", "operator": "regex", "value": r"^[a-z]"}
+                    ],
+                },
+            },
+            {
+                "name": "Not Income",
+                "conditions": {
+                    "logic": "OR",
+                    "rules": [
+                        {"field": "type", "operator": "not_equals", "value": "INCOME"},
+                        {"field": "title", "operator": "contains", "value": "pp"},
+                    ],
+                },
+            },
+            {"name": "Expense", "when": {"type": "EXPENSE"}},
+        ]
+    }
+    sorter = FileSorter.from_dict(config, output_dir)
+    rules = sorter.config["rules"]
+
+    for metadata in [
+        {"type": "INCOME", "title": "Apple", "status": "PAID"},
+        {"type": "DIVIDEND", "title": "Apple", "status": "PAID"},
+        {"type": "DIVIDEND", "title": "apple", "status": "PAID"},
+        {"type": "EXPENSE", "title": "Apple", "status": "PAID"},
+        {"type": "INCOME", "title": "Apple", "status": "PENDING"},
+        {"type": "INCOME", "title": "Apple"},
+        {"type": "INCOME", "title": "Banana"},
+        {},
+    ]:
+        expected = []
+        for rule in rules:
+            result = sorter._evaluate_conditions(rule["conditions"], metadata)
+            assert rule["_predicate"](metadata) is result
+            if result:
+                expected.append(rule["name"])
+        matching = sorter._find_all_matching_rules(metadata)
+        assert [rule["name"] for rule in matching] == expected
+
+
 # ============================================================================
 # TEST: PLACEHOLDER REPLACEMENT
 # ============================================================================
@@ -361,6 +548,22 @@ def test_replace_placeholders_fallback_no_match(basic_config, output_dir):
     assert result == ".pdf"
 
 
+def test_replace_placeholders_repeated_values(basic_config, output_dir):
+    """Test that memoized rendering handles repeated and non-string values."""
+    sorter = FileSorter(basic_config, output_dir)
+    template = "{year|'None'}/{original}{ext}"
+
+    for metadata, filename, expected in [
+        ({"year": 2024}, "a.pdf", "2024/a.pdf"),
+        ({"year": 2024}, "b.pdf", "2024/b.pdf"),
+        ({"year": "2024"}, "a.pdf", "2024/a.pdf"),
+        ({"year": None}, "a.pdf", "None/a.pdf"),
+        ({"year": " "}, "a.pdf", "None/a.pdf"),
+    ]:
+        result = sorter._replace_placeholders(template, metadata, filename)
+        assert result == expected
+
+
 def test_replace_placeholders_template_reference(basic_config, output_dir):
     """Test template reference resolution."""
     sorter = FileSorter(basic_config, output_dir)
@@ -392,12 +595,88 @@ def test_replace_placeholders_nonexistent_template(basic_config, output_dir):
     assert result == "$template.nonexistent"
 
 
+def test_compile_template_program():
+    """Test that templates are tokenized into literal/lookup/fallback instructions."""
+    program = _compile_template(
+        "$template.prefix/{original}{ext} - {event_title|filename|'Unknown'|title}",
+        {"prefix": "{date_time_str}"},
+    )
+
+    assert program == [
+        ("chain", (("field", "date_time_str"),)),
+        ("lit", "/"),
+        ("orig", None),
+        ("ext", None),
+        ("lit", " - "),
+        ("chain", (("field", "event_title"), ("lit", "Unknown"))),
+    ]
+
+
+def test_compiled_templates_are_shared(output_dir):
+    """Test that rules using the same template share one compiled program."""
+    config = {
+        "templates": {"standard": "{date_time_str} - {event_title}.pdf"},
+        "rules": [
+            {
+                "name": "Rule 1",
+                "when": {"type": "A"},
+                "path": "A",
+                "filename": "$template.standard",
+            },
+            {
+                "name": "Rule 2",
+                "when": {"type": "B"},
+                "path": "B",
+                "filename": "$template.standard",
+            },
+        ],
+    }
+    sorter = FileSorter.from_dict(config, output_dir)
+    rule1, rule2 = sorter.config["rules"]
+    assert rule1["_filename_program"] is rule2["_filename_program"]
+
+
+def test_compiled_rules_are_shared_between_sorters(output_dir):
+    """Test that sorters reuse compiled code but keep their own condition values."""
+
+    def regex_config(pattern):
+        return {
+            "rules": [
+                {
+                    "name": "Regex Rule",
+                    "conditions": {
+                        "logic": "AND",
+                        "rules": [
+                            {"field": "title", "operator": "regex", "value": pattern}
+                        ],
+                    },
+                    "path": "Matched",
+                    "filename": "{title}.pdf",
+                }
+            ]
+        }
+
+    first = FileSorter.from_dict(regex_config(r"^Inv"), output_dir)
+    second = FileSorter.from_dict(regex_config(r"^Rec"), output_dir)
+
+    # Same generated code for both, the patterns differ
+    assert first._find_all_matching_rules({"title": "Invoice"})
+    assert not first._find_all_matching_rules({"title": "Receipt"})
+    assert second._find_all_matching_rules({"title": "Receipt"})
+    assert not second._find_all_matching_rules({"title": "Invoice"})
+
+    rule1 = first.config["rules"][0]
+    rule2 = second.config["rules"][0]
+    assert rule1["_predicate"].__code__ is rule2["_predicate"].__code__
+    assert rule1["_filename_program"] is rule2["_filename_program"]
+
+
 # ============================================================================
 # TEST: RULE MATCHING
 # ============================================================================
 
 
-def test_find_matching_rules_single_match(temp_dir, output_dir):
+def test_find_matching_rules_single_match(output_dir):
     """Test finding a single matching rule."""
     config = {
         "rules": [
@@ -414,11 +693,7 @@ def test_find_matching_rules_single_match(temp_dir, output_dir):
             }
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
     metadata = {"type": "INCOME"}
 
     matching = sorter._find_all_matching_rules(metadata)
@@ -426,7 +701,7 @@ def test_find_matching_rules_single_match(temp_dir, output_dir):
     assert matching[0]["name"] == "Rule 1"
 
 
-def test_find_matching_rules_no_match(temp_dir, output_dir):
+def test_find_matching_rules_no_match(output_dir):
     """Test finding no matching rules."""
     config = {
         "rules": [
@@ -443,18 +718,14 @@ def test_find_matching_rules_no_match(temp_dir, output_dir):
             }
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
     metadata = {"type": "EXPENSE"}
 
     matching = sorter._find_all_matching_rules(metadata)
     assert len(matching) == 0
 
 
-def test_find_matching_rules_multiple_matches(temp_dir, output_dir):
+def test_find_matching_rules_multiple_matches(output_dir):
     """Test finding multiple matching rules."""
     config = {
         "rules": [
@@ -482,17 +753,133 @@ def test_find_matching_rules_multiple_matches(temp_dir, output_dir):
             },
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
     metadata = {"type": "INCOME"}
 
     matching = sorter._find_all_matching_rules(metadata)
     assert len(matching) == 2
 
 
+def test_find_matching_rules_indexed_keeps_config_order(output_dir):
+    """Test that rule indexing by discriminator field keeps all matches in order."""
+    config = {
+        "rules": [
+            {
+                "name": "Any Title",
+                "when": {"title": "Report"},
+                "path": "A",
+                "filename": "a.pdf",
+            },
+            {
+                "name": "Income",
+                "when": {"type": ["INCOME", "DIVIDEND"]},
+                "path": "B",
+                "filename": "b.pdf",
+            },
+            {
+                "name": "Contains",
+                "conditions": {
+                    "logic": "AND",
+                    "rules": [
+                        {"field": "title", "operator": "contains", "value": "Rep"}
+                    ],
+                },
+                "path": "C",
+                "filename": "c.pdf",
+            },
+            {
+                "name": "Income Report",
+                "when": {"type": "INCOME", "title": "Report"},
+                "path": "D",
+                "filename": "d.pdf",
+            },
+            {
+                "name": "Expense",
+                "when": {"type": "EXPENSE"},
+                "path": "E",
+                "filename": "e.pdf",
+            },
+        ]
+    }
+    sorter = FileSorter.from_dict(config, output_dir)
+
+    for metadata, expected in [
+        (
+            {"type": "INCOME", "title": "Report"},
+            ["Any Title", "Income", "Contains", "Income Report"],
+        ),
+        ({"type": "DIVIDEND", "title": "Report"}, ["Any Title", "Income", "Contains"]),
+        ({"type": "OTHER", "title": "Report"}, ["Any Title", "Contains"]),
+        ({"title": "Report"}, ["Any Title", "Contains"]),
+        ({"type": "EXPENSE", "title": "Memo"}, ["Expense"]),
+    ]:
+        matching = sorter._find_all_matching_rules(metadata)
+        assert [rule["name"] for rule in matching] == expected
+
+
+def test_find_matching_rules_top_level_without_logic(output_dir):
+    """Test that top-level conditions without 'logic' are indexed like they match."""
+    config = {
+        "rules": [
+            {
+                # Read as an AND group without rules, so it always matches
+                "name": "Single Condition",
+                "conditions": {"field": "type", "operator": "equals", "value": "A"},
+            },
+            {"name": "Type B", "when": {"type": "B"}},
+        ]
+    }
+    sorter = FileSorter.from_dict(config, output_dir)
+
+    for metadata in ({"type": "A"}, {"type": "B"}, {"type": "C"}, {}):
+        expected = [
+            rule["name"]
+            for rule in sorter.config["rules"]
+            if sorter._evaluate_conditions(rule["conditions"], metadata)
+        ]
+        matching = sorter._find_all_matching_rules(metadata)
+        assert [rule["name"] for rule in matching] == expected
+        assert "Single Condition" in expected
+
+
+def test_match_mode_first(sample_file, output_dir):
+    """Test that match_mode 'first' uses the first matching rule."""
+    config = {
+        "match_mode": "first",
+        "rules": [
+            {
+                "name": "Specific",
+                "when": {"type": "TEST", "title": "Special"},
+                "path": "Special",
+                "filename": "{title}.pdf",
+            },
+            {
+                "name": "Fallback",
+                "when": {"type": "TEST"},
+                "path": "Test",
+                "filename": "{title}.pdf",
+            },
+        ],
+    }
+    sorter = FileSorter.from_dict(config, output_dir)
+
+    _, _, rule_name = sorter.get_new_location(sample_file, type="TEST", title="Special")
+    assert rule_name == "Specific"
+
+    _, _, rule_name = sorter.get_new_location(sample_file, type="TEST", title="Other")
+    assert rule_name == "Fallback"
+
+    with pytest.raises(ValueError, match="No matching rule found"):
+        sorter.get_new_location(sample_file, type="NOMATCH")
+
+
+def test_match_mode_invalid(output_dir):
+    """Test that an unknown match_mode is rejected."""
+    config = {"match_mode": "all", "rules": []}
+    with pytest.raises(ValueError, match="Invalid match_mode"):
+        FileSorter.from_dict(config, output_dir)
+
+
 # ============================================================================
 # TEST: GET_NEW_LOCATION
 # ============================================================================
@@ -529,7 +916,7 @@ def test_get_new_location_no_matching_rule(sample_file, basic_config, output_dir
         sorter.get_new_location(sample_file, postbox_type="NOMATCH")
 
 
-def test_get_new_location_multiple_matching_rules(sample_file, temp_dir, output_dir):
+def test_get_new_location_multiple_matching_rules(sample_file, output_dir):
     """Test get_new_location when multiple rules match."""
     config = {
         "rules": [
@@ -547,17 +934,13 @@ def test_get_new_location_multiple_matching_rules(sample_file, temp_dir, output_
             },
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
 
     with pytest.raises(ValueError, match="Multiple rules matched"):
         sorter.get_new_location(sample_file, type="TEST")
 
 
-def test_get_new_location_with_nested_path(sample_file, temp_dir, output_dir):
+def test_get_new_location_with_nested_path(sample_file, output_dir):
     """Test get_new_location with nested path."""
     config = {
         "rules": [
@@ -569,11 +952,7 @@ def test_get_new_location_with_nested_path(sample_file, temp_dir, output_dir):
             }
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
     path, filename, rule_name = sorter.get_new_location(
         sample_file, type="TEST", title="Document"
     )
@@ -584,7 +963,73 @@ def test_get_new_location_with_nested_path(sample_file, temp_dir, output_dir):
     assert filename == "Document.pdf"
 
 
-def test_get_new_location_sanitizes_filename(sample_file, temp_dir, output_dir):
+def test_get_new_location_path_matches_full_sanitizing(sample_file, output_dir):
+    """Test that relative paths end up where sanitizing the full path puts them."""
+    config = {
+        "rules": [
+            {
+                "name": "Path Rule",
+                "when": {"type": "TEST"},
+                "path": "{folder}",
+                "filename": "{title}.pdf",
+            }
+        ]
+    }
+    sorter = FileSorter.from_dict(config, output_dir)
+
+    for folder in ["", "a", "a/b", "a\\b", "Level1/Level2/Level3", "a/b/", "a:b/c?"]:
+        path, _, _ = sorter.get_new_location(
+            sample_file, type="TEST", title="Document", folder=folder
+        )
+        expected = sanitize_filepath(
+            os.path.join(os.path.abspath(output_dir), folder), replacement_text="_"
+        )
+        assert path == expected
+
+
+def test_sanitized_relative_path_has_no_leading_separator(monkeypatch):
+    """Test that sanitized relative paths can't be joined as absolute paths."""
+    # pathvalidate emits "/" separators, also where os.sep is a backslash
+    monkeypatch.setattr(os, "sep", "\\")
+    for relative_path, expected in [
+        ("Dividenden/Apple", "Dividenden/Apple"),
+        ("Dividenden\\Apple", "Dividenden/Apple"),
+        ("/Dividenden/Apple", "Dividenden/Apple"),
+        ("../Dividenden", "Dividenden"),
+    ]:
+        assert _san_relpath(relative_path) == expected
+
+
+def test_get_new_location_windows_paths(sample_file, monkeypatch):
+    """Test that output paths use the separators pathvalidate emits on Windows."""
+    monkeypatch.setattr(os, "sep", "\\")
+    monkeypatch.setattr(os, "path", ntpath)
+    config = {
+        "rules": [
+            {
+                "name": "Dividends",
+                "when": {"type": "DIVIDEND"},
+                "path": "Dividenden/{company}",
+                "filename": "{company}.pdf",
+            }
+        ]
+    }
+    sorter = FileSorter.from_dict(config, "C:\\Users\\me\\out")
+
+    path, filename, _ = sorter.get_new_location(
+        sample_file, type="DIVIDEND", company="Apple"
+    )
+
+    # Same as sanitizing the full path, with "/" separators only
+    expected = sanitize_filepath(
+        ntpath.join("C:\\Users\\me\\out", "Dividenden/Apple"), replacement_text="_"
+    )
+    assert expected == "C:/Users/me/out/Dividenden/Apple"
+    assert path == expected
+    assert filename == "Apple.pdf"
+
+
+def test_get_new_location_sanitizes_filename(sample_file, output_dir):
     """Test that get_new_location sanitizes invalid characters."""
     config = {
         "rules": [
@@ -596,11 +1041,7 @@ def test_get_new_location_sanitizes_filename(sample_file, temp_dir, output_dir):
             }
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
     path, filename, rule_name = sorter.get_new_location(
         sample_file, type="TEST", title="Invalid:Chars<>|"
     )
@@ -612,6 +1053,84 @@ def test_get_new_location_sanitizes_filename(sample_file, temp_dir, output_dir):
     assert "|" not in filename
 
 
+def test_get_new_locations_batch(sample_file, output_dir):
+    """Test batch location lookup, including per-file errors."""
+    config = {
+        "rules": [
+            {
+                "name": "Income",
+                "when": {"type": "INCOME"},
+                "path": "Income",
+                "filename": "{title}.pdf",
+            },
+            {
+                "name": "Expense",
+                "when": {"type": "EXPENSE"},
+                "path": "Expense",
+                "filename": "{title}.pdf",
+            },
+        ]
+    }
+    sorter = FileSorter.from_dict(config, output_dir)
+    results = sorter.get_new_locations(
+        [sample_file, sample_file, sample_file, "nonexistent.pdf"],
+        [
+            {"type": "INCOME", "title": "A"},
+            {"type": "INCOME", "title": "B"},
+            {"type": "OTHER", "title": "C"},
+            {"type": "INCOME", "title": "D"},
+        ],
+    )
+
+    assert results[0] == sorter.get_new_location(sample_file, type="INCOME", title="A")
+    assert results[1][1:] == ("B.pdf", "Income")
+    assert isinstance(results[2], ValueError)
+    assert isinstance(results[3], FileNotFoundError)
+
+
+def test_get_new_locations_batch_matches_single(sample_file, output_dir):
+    """Test that batch results equal get_new_location for every file."""
+    config = {
+        "rules": [
+            {
+                # Top-level rules without 'logic' are an AND group
+                "name": "A",
+                "conditions": {
+                    "rules": [{"field": "a", "operator": "equals", "value": "x"}]
+                },
+                "path": "A",
+            },
+            {
+                "name": "B",
+                "conditions": {
+                    "rules": [{"field": "a", "operator": "equals", "value": "y"}]
+                },
+                "path": "B",
+            },
+            {
+                "name": "Text One",
+                "conditions": {
+                    "logic": "AND",
+                    "rules": [{"field": "n", "operator": "starts_with", "value": "1"}],
+                },
+                "path": "One",
+            },
+        ]
+    }
+    sorter = FileSorter.from_dict(config, output_dir)
+
+    metadata_list = [{"a": "x"}, {"a": "y"}, {"n": 1}, {"n": True}, {"n": 1.0}]
+    results = sorter.get_new_locations([sample_file] * 5, metadata_list)
+
+    for metadata, result in zip(metadata_list, results):
+        try:
+            expected = sorter.get_new_location(sample_file, **metadata)
+        except ValueError as e:
+            assert isinstance(result, ValueError) and str(result) == str(e)
+        else:
+            assert result == expected
+
+
 # ============================================================================
 # TEST: MOVE_FILE
 # ============================================================================
@@ -629,11 +1148,7 @@ def test_move_file_basic(sample_file, output_dir):
             }
         ]
     }
-    config_path = os.path.join(os.path.dirname(sample_file), "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
     dest_path = os.path.join(output_dir, "TestDir")
     dest_file = "moved.pdf"
 
@@ -647,11 +1162,7 @@ def test_move_file_basic(sample_file, output_dir):
 def test_move_file_creates_directories(sample_file, output_dir):
     """Test that move_file creates directories."""
     config = {"rules": []}
-    config_path = os.path.join(os.path.dirname(sample_file), "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
     dest_path = os.path.join(output_dir, "New", "Nested", "Dir")
     dest_file = "moved.pdf"
 
@@ -664,11 +1175,7 @@ def test_move_file_creates_directories(sample_file, output_dir):
 def test_move_file_without_create_dirs(sample_file, output_dir):
     """Test that move_file fails when directories don't exist and create_dirs=False."""
     config = {"rules": []}
-    config_path = os.path.join(os.path.dirname(sample_file), "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
     dest_path = os.path.join(output_dir, "Nonexistent")
     dest_file = "moved.pdf"
 
@@ -680,11 +1187,7 @@ def test_move_file_without_create_dirs(sample_file, output_dir):
 def test_move_file_overwrite(sample_file, output_dir):
     """Test file overwriting behavior."""
     config = {"rules": []}
-    config_path = os.path.join(os.path.dirname(sample_file), "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
     dest_path = output_dir
     dest_file = "existing.pdf"
 
@@ -702,25 +1205,121 @@ def test_move_file_overwrite(sample_file, output_dir):
     assert os.path.exists(result)
 
 
+def test_move_file_cross_device(sample_file, output_dir, monkeypatch):
+    """Test that move_file falls back to copy and delete across filesystems."""
+    config = {"rules": []}
+    sorter = FileSorter.from_dict(config, output_dir)
+
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", cross_device)
+    monkeypatch.setattr(os, "replace", cross_device)
+
+    result = sorter.move_file(sample_file, output_dir, "moved.pdf")
+
+    assert not os.path.exists(sample_file)
+    with open(result) as f:
+        assert f.read() == "test content"
+
+
+def test_move_file_without_hard_links(temp_dir, output_dir, monkeypatch):
+    """Test that move_file renames when the filesystem has no hard links."""
+    config = {"rules": []}
+    sorter = FileSorter.from_dict(config, output_dir)
+
+    def link_not_supported(src, dst):
+        raise OSError(errno.EPERM, "Operation not permitted")
+
+    monkeypatch.setattr(os, "link", link_not_supported)
+
+    for name in ("first.pdf", "second.pdf"):
+        with open(os.path.join(temp_dir, name), "w") as f:
+            f.write(name)
+
+    result = sorter.move_file(os.path.join(temp_dir, "first.pdf"), output_dir, "a.pdf")
+    assert not os.path.exists(os.path.join(temp_dir, "first.pdf"))
+    with open(result) as f:
+        assert f.read() == "first.pdf"
+
+    # The destination is still protected without hard links
+    with pytest.raises(FileExistsError):
+        sorter.move_file(os.path.join(temp_dir, "second.pdf"), output_dir, "a.pdf")
+
+
+def test_move_file_unlink_fails(sample_file, output_dir, monkeypatch):
+    """Test that a failing removal of the original undoes the move."""
+    sorter = FileSorter.from_dict({"rules": []}, output_dir)
+    unlink = os.unlink
+
+    def unlink_not_permitted(path):
+        if path == sample_file:
+            raise OSError(errno.EPERM, "Operation not permitted")
+        unlink(path)
+
+    monkeypatch.setattr(os, "unlink", unlink_not_permitted)
+
+    with pytest.raises(PermissionError):
+        sorter.move_file(sample_file, output_dir, "moved.pdf")
+
+    assert os.path.exists(sample_file)
+    assert not os.path.exists(os.path.join(output_dir, "moved.pdf"))
+
+
 def test_move_file_nonexistent_source(output_dir):
     """Test move_file with non-existent source file."""
     config = {"rules": []}
-    config_path = os.path.join(output_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
 
     with pytest.raises(FileNotFoundError):
         sorter.move_file("nonexistent.pdf", output_dir, "moved.pdf")
 
 
+def test_move_files_batch(temp_dir, output_dir):
+    """Test moving several files at once, including duplicate destinations."""
+    config = {"rules": []}
+    sorter = FileSorter.from_dict(config, output_dir)
+
+    sources = []
+    for i in range(7):
+        source = os.path.join(temp_dir, f"doc{i}.pdf")
+        with open(source, "w") as f:
+            f.write(f"content {i}")
+        sources.append(source)
+    missing = os.path.join(temp_dir, "missing.pdf")
+
+    jobs = [
+        (source, os.path.join(output_dir, f"dir{i % 2}"), f"doc{i}.pdf")
+        for i, source in enumerate(sources[:5])
+    ]
+    # Same destination as the first job, which succeeds
+    jobs.append((sources[5], jobs[0][1], jobs[0][2]))
+    # Same destination as a job whose source is missing
+    jobs.append((missing, output_dir, "shared.pdf"))
+    jobs.append((sources[6], output_dir, "shared.pdf"))
+
+    results = sorter.move_files_batch(jobs, max_workers=4)
+
+    assert len(results) == 8
+    for i in range(5):
+        assert results[i] == os.path.join(output_dir, f"dir{i % 2}", f"doc{i}.pdf")
+        with open(results[i]) as f:
+            assert f.read() == f"content {i}"
+        assert not os.path.exists(sources[i])
+    assert isinstance(results[5], FileExistsError)
+    assert os.path.exists(sources[5])
+    assert isinstance(results[6], FileNotFoundError)
+    assert results[7] == os.path.join(output_dir, "shared.pdf")
+    with open(results[7]) as f:
+        assert f.read() == "content 6"
+
+
 # ============================================================================
 # TEST: INTEGRATION TESTS
 # ============================================================================
 
 
-def test_integration_full_workflow(sample_file, temp_dir, output_dir):
+def test_integration_full_workflow(sample_file, output_dir):
     """Test complete workflow: load config, get location, move file."""
     config = {
         "templates": {"standard": "{date_time_str} - {event_title}.pdf"},
@@ -757,11 +1356,7 @@ def test_integration_full_workflow(sample_file, temp_dir, output_dir):
             }
         ],
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
 
     # Get new location
     path, filename, rule_name = sorter.get_new_location(
@@ -796,11 +1391,7 @@ def test_integration_with_fallback_placeholders(sample_file, temp_dir, output_di
             }
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
 
     # Test with event_title
     path1, filename1, _ = sorter.get_new_location(
@@ -834,7 +1425,7 @@ def test_integration_with_fallback_placeholders(sample_file, temp_dir, output_di
     assert filename3 == "2024-03-17 - Transfer.pdf"
 
 
-def test_integration_complex_conditions(sample_file, temp_dir, output_dir):
+def test_integration_complex_conditions(sample_file, output_dir):
     """Test integration with complex OR/AND conditions."""
     config = {
         "rules": [
@@ -866,11 +1457,7 @@ def test_integration_complex_conditions(sample_file, temp_dir, output_dir):
             }
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
 
     path, filename, rule_name = sorter.get_new_location(
         sample_file, type="DIVIDEND", status="COMPLETED", title="Apple Dividend"
@@ -885,7 +1472,7 @@ def test_integration_complex_conditions(sample_file, temp_dir, output_dir):
 # ============================================================================
 
 
-def test_edge_case_empty_metadata_value(sample_file, temp_dir, output_dir):
+def test_edge_case_empty_metadata_value(sample_file, output_dir):
     """Test handling of empty metadata values."""
     config = {
         "rules": [
@@ -897,18 +1484,14 @@ def test_edge_case_empty_metadata_value(sample_file, temp_dir, output_dir):
             }
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
 
     # Empty string should be skipped
     path, filename, _ = sorter.get_new_location(sample_file, type="TEST", title="")
     assert filename == "Default.pdf"
 
 
-def test_edge_case_none_metadata_value(sample_file, temp_dir, output_dir):
+def test_edge_case_none_metadata_value(sample_file, output_dir):
     """Test handling of None metadata values."""
     config = {
         "rules": [
@@ -920,18 +1503,14 @@ def test_edge_case_none_metadata_value(sample_file, temp_dir, output_dir):
             }
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
 
     # None should be skipped
     path, filename, _ = sorter.get_new_location(sample_file, type="TEST", title=None)
     assert filename == "Default.pdf"
 
 
-def test_edge_case_special_characters_in_metadata(sample_file, temp_dir, output_dir):
+def test_edge_case_special_characters_in_metadata(sample_file, output_dir):
     """Test handling of special characters in metadata."""
     config = {
         "rules": [
@@ -943,11 +1522,7 @@ def test_edge_case_special_characters_in_metadata(sample_file, temp_dir, output_
             }
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
 
     path, filename, _ = sorter.get_new_location(
         sample_file, type="TEST", title="Test<>:|?*"
@@ -962,7 +1537,7 @@ def test_edge_case_special_characters_in_metadata(sample_file, temp_dir, output_
     assert "*" not in filename
 
 
-def test_edge_case_unicode_in_metadata(sample_file, temp_dir, output_dir):
+def test_edge_case_unicode_in_metadata(sample_file, output_dir):
     """Test handling of unicode characters in metadata."""
     config = {
         "rules": [
@@ -974,11 +1549,7 @@ def test_edge_case_unicode_in_metadata(sample_file, temp_dir, output_dir):
             }
         ]
     }
-    config_path = os.path.join(temp_dir, "config.yaml")
-    with open(config_path, "w") as f:
-        yaml.dump(config, f)
-
-    sorter = FileSorter(config_path, output_dir)
+    sorter = FileSorter.from_dict(config, output_dir)
 
     path, filename, _ = sorter.get_new_location(
         sample_file, type="TEST", title="Überweisung äöü 中文"